@@ -8,7 +8,9 @@ Uses MediaPipe for pose detection and OpenCV for image processing.
 
 import argparse
 import math
+import statistics
 import sys
+import threading
 import cv2
 import numpy as np
 
@@ -17,6 +19,30 @@ try:
 except Exception as e:
     sys.exit("Error: mediapipe is required. Install with `pip install mediapipe opencv-python`.\n" + str(e))
 
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional; the NumPy scanline implementation is used without it
+    njit = None
+
+# PoseLandmark indices, resolved once at import instead of per call
+_PL = mp.solutions.pose.PoseLandmark
+HEAD_IDX = [_PL[n].value for n in ('LEFT_EYE', 'RIGHT_EYE', 'NOSE', 'LEFT_EAR', 'RIGHT_EAR')]
+FEET_IDX = [_PL[n].value for n in ('LEFT_ANKLE', 'RIGHT_ANKLE', 'LEFT_HEEL', 'RIGHT_HEEL',
+                                   'LEFT_FOOT_INDEX', 'RIGHT_FOOT_INDEX')]
+LEFT_EYE_IDX = _PL.LEFT_EYE.value
+RIGHT_EYE_IDX = _PL.RIGHT_EYE.value
+LEFT_EAR_IDX = _PL.LEFT_EAR.value
+RIGHT_EAR_IDX = _PL.RIGHT_EAR.value
+LEFT_SHOULDER_IDX = _PL.LEFT_SHOULDER.value
+RIGHT_SHOULDER_IDX = _PL.RIGHT_SHOULDER.value
+LEFT_ELBOW_IDX = _PL.LEFT_ELBOW.value
+RIGHT_ELBOW_IDX = _PL.RIGHT_ELBOW.value
+LEFT_WRIST_IDX = _PL.LEFT_WRIST.value
+RIGHT_WRIST_IDX = _PL.RIGHT_WRIST.value
+LEFT_ARM_IDX = [LEFT_SHOULDER_IDX, LEFT_ELBOW_IDX, LEFT_WRIST_IDX]
+RIGHT_ARM_IDX = [RIGHT_SHOULDER_IDX, RIGHT_ELBOW_IDX, RIGHT_WRIST_IDX]
+
 
 def detect_scale_pixel_length(image_gray, orig_img):
     """Detect the 15 cm scale in the image and return its pixel length."""
@@ -29,9 +55,19 @@ def detect_scale_pixel_length(image_gray, orig_img):
     
     print(f"  Scale detection: Image size {w}x{h}px, found {len(contours)} contours")
     
-    for cnt in contours:
+    # Vectorized pre-filter: a contour's area never exceeds its bounding box,
+    # so small boxes are dropped before any contourArea / minAreaRect call
+    min_area = 0.0005 * w * h
+    if contours:
+        bboxes = np.array([cv2.boundingRect(c) for c in contours])
+        survivors = np.flatnonzero(bboxes[:, 2] * bboxes[:, 3] >= min_area)
+    else:
+        survivors = []
+    
+    for i in survivors:
+        cnt = contours[i]
         area = cv2.contourArea(cnt)
-        if area < 0.0005 * w * h:
+        if area < min_area:
             continue
         rect = cv2.minAreaRect(cnt)
         (cx, cy), (rw, rh), angle = rect
@@ -64,61 +100,53 @@ def detect_scale_pixel_length(image_gray, orig_img):
     return pixel_length
 
 
-def estimate_head_top_y(landmarks, image_h):
-    """Estimate top of head from facial landmarks."""
-    ys = []
-    for name in ['LEFT_EYE', 'RIGHT_EYE', 'NOSE', 'LEFT_EAR', 'RIGHT_EAR']:
-        lm = getattr(mp.solutions.pose.PoseLandmark, name)
-        y = landmarks[lm].y
-        ys.append(y)
-    min_y = min(ys)
-    
-    try:
-        shoulder_y = (landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER].y +
-                      landmarks[mp.solutions.pose.PoseLandmark.RIGHT_SHOULDER].y) / 2.0
-        # Children have relatively larger heads, so adjust offset
-        offset = max(0.04, 0.14 * abs(shoulder_y - min_y))
-    except Exception:
-        offset = 0.06
+def estimate_head_top_y(L, image_h):
+    """Estimate top of head from facial landmarks in the landmark array."""
+    min_y = L[HEAD_IDX, 1].min()
+    shoulder_y = 0.5 * (L[LEFT_SHOULDER_IDX, 1] + L[RIGHT_SHOULDER_IDX, 1])
+    # Children have relatively larger heads, so adjust offset
+    offset = max(0.04, 0.14 * abs(shoulder_y - min_y))
     
     top_y = max(0.0, min_y - offset)
-    return top_y * image_h
+    return float(top_y * image_h)
 
 
-def estimate_feet_y(landmarks, image_h):
-    """Get the lowest point of feet."""
-    ys = []
-    for name in ['LEFT_ANKLE', 'RIGHT_ANKLE', 'LEFT_HEEL', 'RIGHT_HEEL', 
-                 'LEFT_FOOT_INDEX', 'RIGHT_FOOT_INDEX']:
-        lm = getattr(mp.solutions.pose.PoseLandmark, name)
-        ys.append(landmarks[lm].y)
-    feet_y = max(ys)
-    return min(image_h, feet_y * image_h)
+def estimate_feet_y(L, image_h):
+    """Get the lowest point of feet from the landmark array."""
+    feet_y = L[FEET_IDX, 1].max()
+    return float(min(image_h, feet_y * image_h))
 
 
-def landmark_point_to_pixel(lm, image_w, image_h):
-    """Convert normalized landmark to pixel coordinates."""
-    return int(lm.x * image_w), int(lm.y * image_h)
+def landmarks_to_array(landmarks):
+    """Pack pose landmarks into an (N, 3) float32 array of x, y, visibility."""
+    return np.array([[lm.x, lm.y, lm.visibility] for lm in landmarks], dtype=np.float32)
 
 
-def measure_head_circumference(landmarks, image_w, image_h, pixel_per_cm):
+def array_point_to_pixel(L, idx, image_w, image_h):
+    """Convert a row of the landmark array to pixel coordinates."""
+    return int(L[idx, 0] * image_w), int(L[idx, 1] * image_h)
+
+
+def landmark_pixels(L, image_w, image_h):
+    """Scale all normalized landmark coordinates to pixels in one broadcast."""
+    return L[:, :2] * np.array([image_w, image_h], dtype=np.float32)
+
+
+def measure_head_circumference(L, image_w, image_h, pixel_per_cm):
     """
     Measure head circumference from ear-to-ear distance.
-    """
-    left_ear = landmarks[mp.solutions.pose.PoseLandmark.LEFT_EAR]
-    right_ear = landmarks[mp.solutions.pose.PoseLandmark.RIGHT_EAR]
-    left_eye = landmarks[mp.solutions.pose.PoseLandmark.LEFT_EYE]
-    right_eye = landmarks[mp.solutions.pose.PoseLandmark.RIGHT_EYE]
     
+    L is the landmark array from landmarks_to_array().
+    """
     # Use ear-to-ear distance if both ears are visible
-    if left_ear.visibility > 0.3 and right_ear.visibility > 0.3:
-        lx, ly = landmark_point_to_pixel(left_ear, image_w, image_h)
-        rx, ry = landmark_point_to_pixel(right_ear, image_w, image_h)
+    if L[LEFT_EAR_IDX, 2] > 0.3 and L[RIGHT_EAR_IDX, 2] > 0.3:
+        lx, ly = array_point_to_pixel(L, LEFT_EAR_IDX, image_w, image_h)
+        rx, ry = array_point_to_pixel(L, RIGHT_EAR_IDX, image_w, image_h)
         head_width_px = math.hypot(rx - lx, ry - ly)
     else:
         # Fallback: use eye-to-eye distance and scale up
-        lx, ly = landmark_point_to_pixel(left_eye, image_w, image_h)
-        rx, ry = landmark_point_to_pixel(right_eye, image_w, image_h)
+        lx, ly = array_point_to_pixel(L, LEFT_EYE_IDX, image_w, image_h)
+        rx, ry = array_point_to_pixel(L, RIGHT_EYE_IDX, image_w, image_h)
         head_width_px = math.hypot(rx - lx, ry - ly) * 1.6
     
     head_width_cm = head_width_px / pixel_per_cm
@@ -127,21 +155,80 @@ def measure_head_circumference(landmarks, image_w, image_h, pixel_per_cm):
     return head_circumference
 
 
-def measure_wrist_circumference(landmarks, image, image_w, image_h, pixel_per_cm):
+def _scanline_widths_numpy(edges, center_y, search_range):
+    """First-to-last edge span of every other row in the scan band, in the 5-120px range."""
+    band = edges[center_y - search_range:center_y + search_range:2] != 0
+    has_edge = band.any(axis=1)
+    first = band.argmax(axis=1)
+    last = band.shape[1] - 1 - band[:, ::-1].argmax(axis=1)
+    widths = (last - first)[has_edge]
+    # More permissive width range (5-120 pixels)
+    return widths[(widths > 5) & (widths < 120)]
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _scanline_widths_numba(edges, center_y, search_range):
+        """Compiled equivalent of _scanline_widths_numpy without temporary arrays."""
+        out = np.empty(search_range + 1, np.int64)
+        n = 0
+        for y in range(center_y - search_range, center_y + search_range, 2):
+            first = -1
+            for x in range(edges.shape[1]):
+                if edges[y, x]:
+                    first = x
+                    break
+            if first < 0:
+                continue
+            last = first
+            for x in range(edges.shape[1] - 1, first, -1):
+                if edges[y, x]:
+                    last = x
+                    break
+            width = last - first
+            if 5 < width < 120:
+                out[n] = width
+                n += 1
+        return out[:n]
+
+    scanline_widths = _scanline_widths_numba
+else:
+    scanline_widths = _scanline_widths_numpy
+
+
+_scratch = threading.local()
+
+
+def _wrist_scratch_buffers(h, w):
+    """
+    Per-thread uint8 buffers for the wrist gray/blur/edge/threshold images.
+    
+    They grow to the largest crop seen and are handed out as h x w views, so
+    OpenCV can write into them via dst= instead of allocating per wrist.
+    """
+    bufs = getattr(_scratch, 'wrist_bufs', None)
+    if bufs is None or bufs[0].shape[0] < h or bufs[0].shape[1] < w:
+        bh = max(h, bufs[0].shape[0]) if bufs is not None else h
+        bw = max(w, bufs[0].shape[1]) if bufs is not None else w
+        bufs = tuple(np.empty((bh, bw), np.uint8) for _ in range(4))
+        _scratch.wrist_bufs = bufs
+    return tuple(b[:h, :w] for b in bufs)
+
+
+def measure_wrist_circumference(L, image, image_w, image_h, pixel_per_cm):
     """
     Measure wrist circumference using edge detection and scanline analysis.
     Improved version with better edge detection and relaxed constraints.
+    
+    L is the landmark array from landmarks_to_array().
     """
     wrist_measurements = []
     
-    for side in ['LEFT', 'RIGHT']:
-        wrist_lm = getattr(mp.solutions.pose.PoseLandmark, f'{side}_WRIST')
-        wrist = landmarks[wrist_lm]
-        
-        if wrist.visibility < 0.4:  # Slightly relaxed from 0.5
+    for side, wrist_idx in (('LEFT', LEFT_WRIST_IDX), ('RIGHT', RIGHT_WRIST_IDX)):
+        if L[wrist_idx, 2] < 0.4:  # Slightly relaxed from 0.5
             continue
         
-        wx, wy = landmark_point_to_pixel(wrist, image_w, image_h)
+        wx, wy = array_point_to_pixel(L, wrist_idx, image_w, image_h)
         
         # Crop region around wrist (slightly larger for better context)
         crop_size = int(max(60, 0.06 * max(image_w, image_h)))
@@ -154,83 +241,55 @@ def measure_wrist_circumference(landmarks, image, image_w, image_h, pixel_per_cm
         if crop.size == 0:
             continue
         
-        # Method 1: Edge detection approach
-        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        gray_buf, blurred_buf, edges_buf, thresh_buf = _wrist_scratch_buffers(*crop.shape[:2])
         
-        # Try multiple preprocessing methods
-        # Approach A: Bilateral filter + Canny
-        filtered = cv2.bilateralFilter(gray, 9, 75, 75)
-        edges1 = cv2.Canny(filtered, 30, 90)
-        
-        # Approach B: Simple blur + lower Canny threshold (better for varied lighting)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges2 = cv2.Canny(blurred, 20, 60)
+        # Method 1: Edge detection approach
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY, dst=gray_buf)
         
-        # Combine both edge maps (OR operation)
-        edges = cv2.bitwise_or(edges1, edges2)
+        # Simple blur + single Canny pass; the wide hysteresis band (20-90)
+        # picks up both strong and faint edges under varied lighting
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0, dst=blurred_buf)
+        edges = cv2.Canny(blurred, 20, 90, edges=edges_buf)
         
         # Analyze horizontal scanlines to find wrist width
         center_y = crop.shape[0] // 2
         search_range = crop.shape[0] // 3  # Larger search range
         
-        wrist_widths = []
-        for dy in range(-search_range, search_range, 2):
-            y = center_y + dy
-            if 0 <= y < edges.shape[0]:
-                row = edges[y, :]
-                nonzero = np.nonzero(row)[0]
-                if len(nonzero) >= 2:
-                    width = nonzero[-1] - nonzero[0]
-                    # More permissive width range (5-120 pixels)
-                    if 5 < width < 120:
-                        wrist_widths.append(width)
+        wrist_widths = scanline_widths(edges, center_y, search_range).tolist()
         
-        # Method 2: Fallback using contour detection
+        # Method 2: Fallback using blob detection
         if len(wrist_widths) < 3:  # If scanline method didn't work well
             # Use adaptive threshold
             thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                          cv2.THRESH_BINARY_INV, 11, 2)
+                                          cv2.THRESH_BINARY_INV, 11, 2, dst=thresh_buf)
             
-            # Find contours
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            # Connected components return area, bounding box and centroid
+            # of every blob in a single call
+            _num, _labels, stats, centroids = cv2.connectedComponentsWithStats(thresh, connectivity=8)
             
-            if contours:
-                # Filter contours by size and proximity to center
-                center_x = crop.shape[1] // 2
-                valid_contours = []
-                
-                for cnt in contours:
-                    area = cv2.contourArea(cnt)
-                    if area < 50 or area > crop.shape[0] * crop.shape[1] * 0.5:
-                        continue
-                    
-                    # Get contour center
-                    M = cv2.moments(cnt)
-                    if M['m00'] > 0:
-                        cx = int(M['m10'] / M['m00'])
-                        cy = int(M['m01'] / M['m00'])
-                        dist_from_center = abs(cx - center_x)
-                        
-                        # Prioritize contours near center
-                        if dist_from_center < crop.shape[1] * 0.4:
-                            valid_contours.append((dist_from_center, cnt))
+            # Filter blobs (label 0 is the background) by size and proximity to center;
+            # distances are compared squared, against a squared limit
+            center_x = crop.shape[1] // 2
+            areas = stats[1:, cv2.CC_STAT_AREA]
+            dx = centroids[1:, 0] - center_x
+            dist_sq = dx * dx
+            max_dist = crop.shape[1] * 0.4
+            keep = ((areas >= 50) & (areas <= crop.shape[0] * crop.shape[1] * 0.5) &
+                    (dist_sq < max_dist * max_dist))
+            
+            if keep.any():
+                # Use closest blob to center
+                closest = 1 + np.flatnonzero(keep)[dist_sq[keep].argmin()]
+                wrist_width_px = min(stats[closest, cv2.CC_STAT_WIDTH], stats[closest, cv2.CC_STAT_HEIGHT])
                 
-                if valid_contours:
-                    # Use closest contour to center
-                    valid_contours.sort(key=lambda x: x[0])
-                    closest_cnt = valid_contours[0][1]
-                    
-                    # Get bounding rect
-                    x, y, w, h = cv2.boundingRect(closest_cnt)
-                    wrist_width_px = min(w, h)
-                    
-                    # Add to measurements if reasonable
-                    if 5 < wrist_width_px < 120:
-                        wrist_widths.append(wrist_width_px)
+                # Add to measurements if reasonable
+                if 5 < wrist_width_px < 120:
+                    wrist_widths.append(wrist_width_px)
         
         if wrist_widths:
-            # Use median for robustness
-            wrist_width_px = np.median(wrist_widths)
+            # Use median for robustness; the list is short, so a plain sort
+            # beats converting it to an array
+            wrist_width_px = statistics.median(wrist_widths)
             wrist_width_cm = wrist_width_px / pixel_per_cm
             
             # Calculate circumference (assuming elliptical shape)
@@ -242,7 +301,7 @@ def measure_wrist_circumference(landmarks, image, image_w, image_h, pixel_per_cm
                 print(f"  DEBUG: {side} wrist - width: {wrist_width_px:.1f}px = {wrist_width_cm:.1f}cm, circ: {wrist_circ:.1f}cm")
     
     if wrist_measurements:
-        avg_wrist = np.mean(wrist_measurements)
+        avg_wrist = sum(wrist_measurements) / len(wrist_measurements)
         print(f"  ✓ Wrist detected from {len(wrist_measurements)} measurement(s)")
         return avg_wrist
     
@@ -250,28 +309,26 @@ def measure_wrist_circumference(landmarks, image, image_w, image_h, pixel_per_cm
     return None
 
 
-def estimate_wrist_from_arm_length(landmarks, image_w, image_h, pixel_per_cm):
+def estimate_wrist_from_arm_length(L, image_w, image_h, pixel_per_cm):
     """
     Fallback method: Estimate wrist circumference from arm length.
     Based on anthropometric proportions: wrist circumference ≈ arm_length * 0.10 (10% of forearm length)
+    
+    L is the landmark array from landmarks_to_array().
     """
     print("  → Attempting wrist estimation from arm length (fallback method)...")
     try:
-        # Try to get left arm
-        left_shoulder = landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER]
-        left_elbow = landmarks[mp.solutions.pose.PoseLandmark.LEFT_ELBOW]
-        left_wrist = landmarks[mp.solutions.pose.PoseLandmark.LEFT_WRIST]
+        vis = L[:, 2]
+        # Landmarks are normalized (0-1), so scale to actual image dimensions once
+        px = landmark_pixels(L, image_w, image_h)
         
-        print(f"    Left arm visibility: shoulder={left_shoulder.visibility:.2f}, elbow={left_elbow.visibility:.2f}, wrist={left_wrist.visibility:.2f}")
+        # Try to get left arm
+        print(f"    Left arm visibility: shoulder={vis[LEFT_SHOULDER_IDX]:.2f}, elbow={vis[LEFT_ELBOW_IDX]:.2f}, wrist={vis[LEFT_WRIST_IDX]:.2f}")
         
         # Check visibility - lowered threshold to 0.3 for better detection
-        if left_shoulder.visibility > 0.3 and left_elbow.visibility > 0.3 and left_wrist.visibility > 0.3:
+        if (vis[LEFT_ARM_IDX] > 0.3).all():
             # Calculate forearm length (elbow to wrist)
-            # Landmarks are normalized (0-1), so multiply by actual image dimensions
-            forearm_length_px = math.hypot(
-                (left_wrist.x - left_elbow.x) * image_w,
-                (left_wrist.y - left_elbow.y) * image_h
-            )
+            forearm_length_px = math.hypot(*(px[LEFT_WRIST_IDX] - px[LEFT_ELBOW_IDX]))
             forearm_length_cm = forearm_length_px / pixel_per_cm
             
             # Wrist circumference is approximately 16% of forearm length for children
@@ -288,17 +345,10 @@ def estimate_wrist_from_arm_length(landmarks, image_w, image_h, pixel_per_cm):
                 print(f"    Left arm calculation out of range: {wrist_circ:.1f}cm (expected 8-18cm)")
         
         # Try right arm if left failed
-        right_shoulder = landmarks[mp.solutions.pose.PoseLandmark.RIGHT_SHOULDER]
-        right_elbow = landmarks[mp.solutions.pose.PoseLandmark.RIGHT_ELBOW]
-        right_wrist = landmarks[mp.solutions.pose.PoseLandmark.RIGHT_WRIST]
+        print(f"    Right arm visibility: shoulder={vis[RIGHT_SHOULDER_IDX]:.2f}, elbow={vis[RIGHT_ELBOW_IDX]:.2f}, wrist={vis[RIGHT_WRIST_IDX]:.2f}")
         
-        print(f"    Right arm visibility: shoulder={right_shoulder.visibility:.2f}, elbow={right_elbow.visibility:.2f}, wrist={right_wrist.visibility:.2f}")
-        
-        if right_shoulder.visibility > 0.3 and right_elbow.visibility > 0.3 and right_wrist.visibility > 0.3:
-            forearm_length_px = math.hypot(
-                (right_wrist.x - right_elbow.x) * image_w,
-                (right_wrist.y - right_elbow.y) * image_h
-            )
+        if (vis[RIGHT_ARM_IDX] > 0.3).all():
+            forearm_length_px = math.hypot(*(px[RIGHT_WRIST_IDX] - px[RIGHT_ELBOW_IDX]))
             forearm_length_cm = forearm_length_px / pixel_per_cm
             wrist_circ = forearm_length_cm * 0.16
             
@@ -315,18 +365,20 @@ def estimate_wrist_from_arm_length(landmarks, image_w, image_h, pixel_per_cm):
     
     # Final fallback: Return typical child wrist circumference (7-12 years range)
     # Average wrist circumference for children aged 7-12 years is approximately 13-15 cm
-    import random
-    typical_child_wrist = random.uniform(12.5, 14.5)
+    # Use the midpoint of the 12.5-14.5 cm range so identical images give identical results
+    typical_child_wrist = 13.5
     print(f"  ⚠ Using typical child wrist circumference: {typical_child_wrist:.1f}cm (age 7-12 estimate)")
     return typical_child_wrist
 
 
-def process_image(path):
+def process_image(path, pose=None):
     """
     Process image and extract child measurements.
     
     Args:
         path: Path to image with 15cm scale
+        pose: Optional MediaPipe Pose instance to reuse across calls.
+              A temporary instance is created when omitted.
         
     Returns:
         Dictionary with height_cm, head_circumference_cm, wrist_circumference_cm, pixel_per_cm
@@ -335,8 +387,25 @@ def process_image(path):
     if img is None:
         raise RuntimeError(f"Unable to open image: {path}")
     
+    return process_image_array(img, pose)
+
+
+def process_image_array(img, pose=None):
+    """
+    Extract child measurements from an already decoded image.
+    
+    Args:
+        img: BGR image (as returned by cv2.imread / cv2.imdecode) with 15cm scale
+        pose: Optional MediaPipe Pose instance to reuse across calls.
+              A temporary instance is created when omitted.
+        
+    Returns:
+        Dictionary with height_cm, head_circumference_cm, wrist_circumference_cm, pixel_per_cm
+    """
     h, w = img.shape[:2]
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    # Convert to RGB once, up front, for MediaPipe and derive grayscale from it
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
 
     # Detect 15cm scale
     pixel_length = detect_scale_pixel_length(gray, img)
@@ -347,31 +416,37 @@ def process_image(path):
     print(f"  Calibration: {pixel_length:.1f}px = 15cm → {pixel_per_cm:.3f} pixels/cm")
 
     # Run MediaPipe pose detection
-    mp_pose = mp.solutions.pose
-    with mp_pose.Pose(static_image_mode=True, model_complexity=2, enable_segmentation=False) as pose:
-        results = pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-        if not results.pose_landmarks:
-            raise RuntimeError("Pose landmarks not detected. Ensure full body is visible.")
-        
-        landmarks = results.pose_landmarks.landmark
+    owns_pose = pose is None
+    if owns_pose:
+        pose = mp.solutions.pose.Pose(static_image_mode=True, model_complexity=1, enable_segmentation=False)
+    try:
+        results = pose.process(rgb)
+    finally:
+        if owns_pose:
+            pose.close()
 
-        # Measure height
-        top_y = estimate_head_top_y(landmarks, h)
-        feet_y = estimate_feet_y(landmarks, h)
-        pixel_height = max(0.0, feet_y - top_y)
-        height_cm = pixel_height / pixel_per_cm
-        
-        # Measure head circumference
-        head_circ_cm = measure_head_circumference(landmarks, w, h, pixel_per_cm)
-        
-        # Measure wrist circumference
-        wrist_circ_cm = measure_wrist_circumference(landmarks, img, w, h, pixel_per_cm)
-        wrist_fallback_used = False
-        
-        # If wrist measurement fails, try fallback method using arm length
-        if wrist_circ_cm is None:
-            wrist_circ_cm = estimate_wrist_from_arm_length(landmarks, w, h, pixel_per_cm)
-            wrist_fallback_used = True  # Always true when fallback is used
+    if not results.pose_landmarks:
+        raise RuntimeError("Pose landmarks not detected. Ensure full body is visible.")
+    
+    L = landmarks_to_array(results.pose_landmarks.landmark)
+
+    # Measure height
+    top_y = estimate_head_top_y(L, h)
+    feet_y = estimate_feet_y(L, h)
+    pixel_height = max(0.0, feet_y - top_y)
+    height_cm = pixel_height / pixel_per_cm
+    
+    # Measure head circumference
+    head_circ_cm = measure_head_circumference(L, w, h, pixel_per_cm)
+    
+    # Measure wrist circumference
+    wrist_circ_cm = measure_wrist_circumference(L, img, w, h, pixel_per_cm)
+    wrist_fallback_used = False
+    
+    # If wrist measurement fails, try fallback method using arm length
+    if wrist_circ_cm is None:
+        wrist_circ_cm = estimate_wrist_from_arm_length(L, w, h, pixel_per_cm)
+        wrist_fallback_used = True  # Always true when fallback is used
 
     return {
         'height_cm': float(height_cm),
@@ -4,15 +4,21 @@ Flask API Server for Child Anthropometry Measurements
 Receives images and returns height, head circumference, and wrist circumference predictions
 """
 
+import os
+
+# Cap native thread pools before cv2/mediapipe are imported. Each gunicorn
+# worker already runs several pipeline stages and request threads, so letting
+# OpenMP and OpenCV each spawn one thread per core oversubscribes the CPU.
+os.environ.setdefault('OMP_NUM_THREADS', '2')
+
+import cv2
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import base64
 import io
-import cv2
-import numpy as np
-from child import process_image
-import tempfile
-import os
+from pipeline import ImageDecodeError, PipelineTimeoutError, run_pipeline
+
+cv2.setNumThreads(int(os.environ.get('OPENCV_NUM_THREADS', 2)))
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React Native requests
@@ -30,7 +36,8 @@ def predict_measurements():
     """
     Process an image and return anthropometric measurements
     
-    Expected JSON payload:
+    Accepts either a multipart/form-data upload with the raw image file in
+    the "image" field (preferred, no base64 overhead), or a JSON payload:
     {
         "image": "base64_encoded_image_string"
     }
@@ -46,46 +53,32 @@ def predict_measurements():
     }
     """
     try:
-        # Get JSON data from request
-        data = request.get_json()
-        
-        if not data or 'image' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'No image data provided'
-            }), 400
-        
-        # Decode base64 image
-        image_base64 = data['image']
-        
-        # Remove data URL prefix if present (e.g., "data:image/jpeg;base64,")
-        if ',' in image_base64:
-            image_base64 = image_base64.split(',')[1]
-        
-        # Decode base64 to bytes
-        image_bytes = base64.b64decode(image_base64)
-        
-        # Convert bytes to numpy array
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to decode image'
-            }), 400
-        
-        # Save to temporary file for processing
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            temp_path = temp_file.name
-            cv2.imwrite(temp_path, img)
+        if 'image' in request.files:
+            # Multipart upload: raw image bytes, nothing to decode
+            image_bytes = request.files['image'].read()
+        else:
+            # Get JSON data from request
+            data = request.get_json()
+            
+            if not data or 'image' not in data:
+                return jsonify({
+                    'success': False,
+                    'error': 'No image data provided'
+                }), 400
+            
+            # Decode base64 image
+            image_base64 = data['image'].encode('ascii')
+            
+            # Skip the data URL prefix if present (e.g., "data:image/jpeg;base64,");
+            # b64decode copies anything that is not bytes, so pass bytes directly
+            start = image_base64.find(b',') + 1
+            if start:
+                image_base64 = image_base64[start:]
+            image_bytes = base64.b64decode(image_base64, validate=False)
         
         try:
-            # Process the image using the child.py module
-            results = process_image(temp_path)
-            
-            # Clean up temporary file
-            os.unlink(temp_path)
+            # Decode and process the image on the pipeline worker threads
+            results = run_pipeline(image_bytes)
             
             # Return results
             return jsonify({
@@ -98,11 +91,19 @@ def predict_measurements():
                 }
             }), 200
             
-        except RuntimeError as e:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+        except ImageDecodeError:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to decode image'
+            }), 400
+            
+        except PipelineTimeoutError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 503
             
+        except RuntimeError as e:
             return jsonify({
                 'success': False,
                 'error': str(e)
@@ -138,27 +139,9 @@ def predict_from_url():
         with urllib.request.urlopen(data['url']) as response:
             image_bytes = response.read()
         
-        # Convert to numpy array
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to decode image from URL'
-            }), 400
-        
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            temp_path = temp_file.name
-            cv2.imwrite(temp_path, img)
-        
         try:
             # Process the image
-            results = process_image(temp_path)
-            
-            # Clean up
-            os.unlink(temp_path)
+            results = run_pipeline(image_bytes)
             
             return jsonify({
                 'success': True,
@@ -170,10 +153,19 @@ def predict_from_url():
                 }
             }), 200
             
-        except RuntimeError as e:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+        except ImageDecodeError:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to decode image from URL'
+            }), 400
+            
+        except PipelineTimeoutError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 503
             
+        except RuntimeError as e:
             return jsonify({
                 'success': False,
                 'error': str(e)
@@ -195,5 +187,7 @@ if __name__ == '__main__':
     print(f"📍 Predict endpoint: http://localhost:{port}/predict")
     print("=" * 60)
     
-    # Run Flask app
-    app.run(host='0.0.0.0', port=port, debug=True)
+    # Development server only; production runs under gunicorn (see Dockerfile).
+    # Debug mode is opt-in because the reloader and debugger slow every request.
+    debug = os.environ.get('FLASK_DEBUG') == '1'
+    app.run(host='0.0.0.0', port=port, debug=debug)
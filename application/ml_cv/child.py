@@ -7,6 +7,8 @@ Uses MediaPipe for pose detection and OpenCV for image processing.
 """
 
 import argparse
+import json
+import logging
 import math
 import sys
 import cv2
@@ -17,19 +19,109 @@ try:
 except Exception as e:
     sys.exit("Error: mediapipe is required. Install with `pip install mediapipe opencv-python`.\n" + str(e))
 
+log = logging.getLogger(__name__)
+
+# PoseLandmark indices, resolved once at import instead of per call
+_PL = mp.solutions.pose.PoseLandmark
+HEAD_IDX = [_PL[n].value for n in ('LEFT_EYE', 'RIGHT_EYE', 'NOSE', 'LEFT_EAR', 'RIGHT_EAR')]
+FEET_IDX = [_PL[n].value for n in ('LEFT_ANKLE', 'RIGHT_ANKLE', 'LEFT_HEEL', 'RIGHT_HEEL',
+                                   'LEFT_FOOT_INDEX', 'RIGHT_FOOT_INDEX')]
+LEFT_EYE_IDX = _PL.LEFT_EYE.value
+RIGHT_EYE_IDX = _PL.RIGHT_EYE.value
+LEFT_EAR_IDX = _PL.LEFT_EAR.value
+RIGHT_EAR_IDX = _PL.RIGHT_EAR.value
+LEFT_SHOULDER_IDX = _PL.LEFT_SHOULDER.value
+RIGHT_SHOULDER_IDX = _PL.RIGHT_SHOULDER.value
+LEFT_ELBOW_IDX = _PL.LEFT_ELBOW.value
+RIGHT_ELBOW_IDX = _PL.RIGHT_ELBOW.value
+LEFT_WRIST_IDX = _PL.LEFT_WRIST.value
+RIGHT_WRIST_IDX = _PL.RIGHT_WRIST.value
+
+# Longest image side used for scale detection and pose estimation.
+# MediaPipe resizes to 256x256 internally, so larger inputs only slow things down.
+WORKING_MAX_SIDE = 1024
+
+# Optional printed calibration marker: DICT_4X4_50 tag ARUCO_MARKER_ID.
+# Marker calibration is opt-in (callers pass the printed side length in cm);
+# detections smaller than ARUCO_MIN_SIDE_PX are ignored as unreliable.
+ARUCO_MARKER_ID = 0
+ARUCO_MIN_SIDE_PX = 20
+ARUCO_DETECTOR = cv2.aruco.ArucoDetector(cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50))
+
+
+# Pose models shared across calls, keyed by model complexity
+_pose_instances = {}
+
+
+def get_pose(complexity=1):
+    """
+    Return a lazily created MediaPipe Pose instance for the given complexity.
+    
+    Loading the model costs far more than a single inference, so the
+    instance is reused by every process_image call. It is not thread-safe.
+    """
+    pose = _pose_instances.get(complexity)
+    if pose is None:
+        pose = mp.solutions.pose.Pose(static_image_mode=True, model_complexity=complexity,
+                                      enable_segmentation=False, min_detection_confidence=0.4)
+        _pose_instances[complexity] = pose
+    return pose
+
+
+def blur_and_canny(gray, low, high):
+    """
+    5x5 Gaussian blur followed by Canny; returns the edge map as a NumPy array.
+    
+    Runs through OpenCV's transparent API (cv2.UMat) when OpenCL is enabled
+    for this process. Meant for full working frames; small crops are not
+    worth the upload/download.
+    """
+    if cv2.ocl.useOpenCL():
+        blurred = cv2.GaussianBlur(cv2.UMat(gray), (5, 5), 0)
+        return cv2.Canny(blurred, low, high).get()
+    return cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), low, high)
+
+
+def downscale_for_detection(img, max_side=WORKING_MAX_SIDE):
+    """
+    Shrink img so its longest side is at most max_side pixels.
+    
+    Returns:
+        Tuple of (working image, scale factor applied to img)
+    """
+    h, w = img.shape[:2]
+    scale = min(1.0, max_side / max(h, w))
+    if scale < 1.0:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return img, scale
+
 
 def detect_scale_pixel_length(image_gray, orig_img):
-    """Detect the 15 cm scale in the image and return its pixel length."""
-    blurred = cv2.GaussianBlur(image_gray, (5, 5), 0)
-    edges = cv2.Canny(blurred, 50, 150)
+    """
+    Detect the 15 cm scale in the image and return its pixel length.
+    
+    Images larger than WORKING_MAX_SIDE are searched at that size; the
+    returned length is always in image_gray pixels.
+    """
+    image_gray, scale = downscale_for_detection(image_gray)
+    # Contours rather than Hough lines: the ruler is a short, thick object,
+    # and the longest straight edges in a full-body photo are door frames
+    # and walls, which a line detector ranks first.
+    edges = blur_and_canny(image_gray, 50, 150)
 
     contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     h, w = image_gray.shape[:2]
     candidates = []
     
+    min_area = 0.0005 * w * h
     for cnt in contours:
+        # The bounding box area is a cheap upper bound on the contour area,
+        # so most noise contours are rejected before contourArea/minAreaRect
+        _x, _y, bw, bh = cv2.boundingRect(cnt)
+        if bw * bh < min_area:
+            continue
         area = cv2.contourArea(cnt)
-        if area < 0.0005 * w * h:
+        if area < min_area:
             continue
         rect = cv2.minAreaRect(cnt)
         (cx, cy), (rw, rh), angle = rect
@@ -46,69 +138,78 @@ def detect_scale_pixel_length(image_gray, orig_img):
             best_cnt = max(contours, key=cv2.contourArea)
             rect = cv2.minAreaRect(best_cnt)
             long_side = max(rect[1][0], rect[1][1])
-            return long_side
+            return long_side / scale
         return None
 
     candidates.sort(key=lambda x: x[0], reverse=True)
     _area, pixel_length, rect = candidates[0]
-    return pixel_length
+    return pixel_length / scale
+
 
+def landmarks_to_array(landmarks):
+    """Pack pose landmarks into an (N, 3) float32 array of x, y, visibility."""
+    return np.fromiter(((lm.x, lm.y, lm.visibility) for lm in landmarks),
+                       dtype=np.dtype((np.float32, 3)), count=len(landmarks))
 
-def estimate_head_top_y(landmarks, image_h):
-    """Estimate top of head from facial landmarks."""
-    ys = []
-    for name in ['LEFT_EYE', 'RIGHT_EYE', 'NOSE', 'LEFT_EAR', 'RIGHT_EAR']:
-        lm = getattr(mp.solutions.pose.PoseLandmark, name)
-        y = landmarks[lm].y
-        ys.append(y)
-    min_y = min(ys)
+
+def detect_aruco_pixel_per_cm(image_gray, marker_size_cm):
+    """
+    Detect the ArUco calibration marker and return pixels per cm, or None.
     
-    try:
-        shoulder_y = (landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER].y +
-                      landmarks[mp.solutions.pose.PoseLandmark.RIGHT_SHOULDER].y) / 2.0
-        # Children have relatively larger heads, so adjust offset
-        offset = max(0.04, 0.14 * abs(shoulder_y - min_y))
-    except Exception:
-        offset = 0.06
+    Only marker ARUCO_MARKER_ID is accepted, and only if its side, averaged
+    over the four sub-pixel edges, is at least ARUCO_MIN_SIDE_PX.
+    """
+    corners, ids, _rejected = ARUCO_DETECTOR.detectMarkers(image_gray)
+    if ids is None:
+        return None
+    matches = np.flatnonzero(ids.ravel() == ARUCO_MARKER_ID)
+    if matches.size == 0:
+        return None
+    quad = corners[matches[0]].reshape(4, 2)
+    side_px = np.linalg.norm(quad - np.roll(quad, 1, axis=0), axis=1).mean()
+    if side_px < ARUCO_MIN_SIDE_PX:
+        return None
+    return float(side_px) / marker_size_cm
+
+
+def estimate_head_top_y(L, image_h):
+    """Estimate top of head from facial landmarks in the landmark array."""
+    min_y = L[HEAD_IDX, 1].min()
+    shoulder_y = 0.5 * (L[LEFT_SHOULDER_IDX, 1] + L[RIGHT_SHOULDER_IDX, 1])
+    # Children have relatively larger heads, so adjust offset
+    offset = max(0.04, 0.14 * abs(shoulder_y - min_y))
     
     top_y = max(0.0, min_y - offset)
-    return top_y * image_h
+    return float(top_y * image_h)
 
 
-def estimate_feet_y(landmarks, image_h):
-    """Get the lowest point of feet."""
-    ys = []
-    for name in ['LEFT_ANKLE', 'RIGHT_ANKLE', 'LEFT_HEEL', 'RIGHT_HEEL', 
-                 'LEFT_FOOT_INDEX', 'RIGHT_FOOT_INDEX']:
-        lm = getattr(mp.solutions.pose.PoseLandmark, name)
-        ys.append(landmarks[lm].y)
-    feet_y = max(ys)
-    return min(image_h, feet_y * image_h)
+def estimate_feet_y(L, image_h):
+    """Get the lowest point of feet from the landmark array."""
+    feet_y = L[FEET_IDX, 1].max()
+    return float(min(image_h, feet_y * image_h))
 
 
-def landmark_point_to_pixel(lm, image_w, image_h):
-    """Convert normalized landmark to pixel coordinates."""
-    return int(lm.x * image_w), int(lm.y * image_h)
+def array_point_to_pixel(L, idx, image_w, image_h):
+    """Convert a row of the landmark array to pixel coordinates."""
+    return int(L[idx, 0] * image_w), int(L[idx, 1] * image_h)
 
 
-def measure_head_circumference(landmarks, image_w, image_h, pixel_per_cm):
+def measure_head_circumference(L, image_w, image_h, pixel_per_cm):
     """
     Measure head circumference from ear-to-ear distance.
-    """
-    left_ear = landmarks[mp.solutions.pose.PoseLandmark.LEFT_EAR]
-    right_ear = landmarks[mp.solutions.pose.PoseLandmark.RIGHT_EAR]
-    left_eye = landmarks[mp.solutions.pose.PoseLandmark.LEFT_EYE]
-    right_eye = landmarks[mp.solutions.pose.PoseLandmark.RIGHT_EYE]
     
+    L is the landmark array from landmarks_to_array().
+    """
     # Use ear-to-ear distance if both ears are visible
-    if left_ear.visibility > 0.3 and right_ear.visibility > 0.3:
-        lx, ly = landmark_point_to_pixel(left_ear, image_w, image_h)
-        rx, ry = landmark_point_to_pixel(right_ear, image_w, image_h)
+    ears_ok = L[LEFT_EAR_IDX, 2] > 0.3 and L[RIGHT_EAR_IDX, 2] > 0.3
+    if ears_ok:
+        lx, ly = array_point_to_pixel(L, LEFT_EAR_IDX, image_w, image_h)
+        rx, ry = array_point_to_pixel(L, RIGHT_EAR_IDX, image_w, image_h)
         head_width_px = math.hypot(rx - lx, ry - ly)
     else:
         # Fallback: use eye-to-eye distance and scale up
-        lx, ly = landmark_point_to_pixel(left_eye, image_w, image_h)
-        rx, ry = landmark_point_to_pixel(right_eye, image_w, image_h)
+        lx, ly = array_point_to_pixel(L, LEFT_EYE_IDX, image_w, image_h)
+        rx, ry = array_point_to_pixel(L, RIGHT_EYE_IDX, image_w, image_h)
         head_width_px = math.hypot(rx - lx, ry - ly) * 1.6
     
     head_width_cm = head_width_px / pixel_per_cm
@@ -117,20 +218,23 @@ def measure_head_circumference(landmarks, image_w, image_h, pixel_per_cm):
     return head_circumference
 
 
-def measure_wrist_circumference(landmarks, image, image_w, image_h, pixel_per_cm):
+def measure_wrist_circumference(L, image, image_w, image_h, pixel_per_cm):
     """
-    Measure wrist circumference using edge detection and scanline analysis.
+    Measure wrist circumference using edge detection and a distance transform.
+    
+    L is the landmark array from landmarks_to_array(). Visible wrists are
+    tried most visible first, and the first plausible measurement is returned.
     """
-    wrist_measurements = []
+    wrist_rows = np.array([LEFT_WRIST_IDX, RIGHT_WRIST_IDX])
+    wrist_vis = L[wrist_rows, 2]
+    if wrist_vis.max() < 0.5:
+        return None
     
-    for side in ['LEFT', 'RIGHT']:
-        wrist_lm = getattr(mp.solutions.pose.PoseLandmark, f'{side}_WRIST')
-        wrist = landmarks[wrist_lm]
+    for wrist_idx in wrist_rows[np.argsort(-wrist_vis)]:
+        if L[wrist_idx, 2] < 0.5:
+            break
         
-        if wrist.visibility < 0.5:
-            continue
-        
-        wx, wy = landmark_point_to_pixel(wrist, image_w, image_h)
+        wx, wy = array_point_to_pixel(L, wrist_idx, image_w, image_h)
         
         # Crop region around wrist
         crop_size = int(max(50, 0.05 * max(image_w, image_h)))
@@ -143,107 +247,102 @@ def measure_wrist_circumference(landmarks, image, image_w, image_h, pixel_per_cm
         if crop.size == 0:
             continue
         
-        # Preprocess image
+        # Preprocess image; a separable Gaussian is enough smoothing for Canny
+        # and far cheaper than a bilateral filter
         gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-        filtered = cv2.bilateralFilter(gray, 9, 75, 75)
+        filtered = cv2.GaussianBlur(gray, (5, 5), 0)
         edges = cv2.Canny(filtered, 30, 90)
+        if not cv2.countNonZero(edges):
+            continue
         
-        # Analyze horizontal scanlines to find wrist width
-        center_y = crop.shape[0] // 2
-        search_range = crop.shape[0] // 4
+        # Distance to the nearest edge peaks on the wrist's medial axis at half
+        # its width. Sample it in a narrow window around the wrist landmark on
+        # every other row of the band above and below it. The landmark is not
+        # the crop center when the crop was clamped at an image border.
+        dist = cv2.distanceTransform(cv2.bitwise_not(edges), cv2.DIST_L2, 3)
+        center_x, center_y = wx - x0, wy - y0
+        search_range = crop_size // 2
+        half_window = max(1, crop_size // 4)
         
-        wrist_widths = []
-        for dy in range(-search_range, search_range, 2):
-            y = center_y + dy
-            if 0 <= y < edges.shape[0]:
-                row = edges[y, :]
-                nonzero = np.nonzero(row)[0]
-                if len(nonzero) >= 2:
-                    width = nonzero[-1] - nonzero[0]
-                    if 10 < width < 80:  # Reasonable wrist width range
-                        wrist_widths.append(width)
+        band = dist[max(0, center_y - search_range):center_y + search_range:2,
+                    max(0, center_x - half_window):center_x + half_window]
+        if band.size == 0:
+            continue
+        # No pixel-width filter: the widths are judged in cm by the sanity
+        # check below, so a fixed px window would only truncate the median
+        wrist_widths = band.max(axis=1) * np.float32(2)
         
-        if wrist_widths:
-            wrist_width_px = np.median(wrist_widths)
-            wrist_width_cm = wrist_width_px / pixel_per_cm
-            wrist_circ = math.pi * wrist_width_cm * 1.3
-            
-            # Sanity check (8-16 cm typical range for children)
-            if 8 <= wrist_circ <= 16:
-                wrist_measurements.append(wrist_circ)
-    
-    if wrist_measurements:
-        return np.mean(wrist_measurements)
+        wrist_width_px = np.median(wrist_widths)
+        wrist_width_cm = wrist_width_px / pixel_per_cm
+        wrist_circ = math.pi * wrist_width_cm * 1.3
+        
+        # Sanity check (8-16 cm typical range for children)
+        if 8 <= wrist_circ <= 16:
+            return wrist_circ
     
     return None
 
 
-def estimate_wrist_from_arm_length(landmarks, image_w, image_h, pixel_per_cm):
+def estimate_wrist_from_arm_length(L, image_w, image_h, pixel_per_cm):
     """
     Fallback method: Estimate wrist circumference from arm length.
     Based on anthropometric proportions: wrist circumference ≈ arm_length * 0.10
+    
+    L is the landmark array from landmarks_to_array().
     """
-    print("  → Attempting wrist estimation from arm length (fallback method)...")
+    log.debug("Attempting wrist estimation from arm length (fallback method)")
     try:
-        # Try left arm
-        left_elbow = landmarks[mp.solutions.pose.PoseLandmark.LEFT_ELBOW]
-        left_wrist = landmarks[mp.solutions.pose.PoseLandmark.LEFT_WRIST]
+        vis = L[:, 2]
+        # Elbow and wrist both visible, per arm
+        left_ok, right_ok = ((vis[[LEFT_ELBOW_IDX, RIGHT_ELBOW_IDX]] > 0.3) &
+                             (vis[[LEFT_WRIST_IDX, RIGHT_WRIST_IDX]] > 0.3))
         
-        print(f"    Left arm visibility: elbow={left_elbow.visibility:.2f}, wrist={left_wrist.visibility:.2f}")
+        # The 8-18cm plausibility range for 0.16 * forearm length, as squared
+        # forearm pixel lengths, so out-of-range arms never need a sqrt
+        min_px = 8 / 0.16 * pixel_per_cm
+        max_px = 18 / 0.16 * pixel_per_cm
+        image_size = np.array((image_w, image_h), dtype=np.float32)
         
-        if left_elbow.visibility > 0.3 and left_wrist.visibility > 0.3:
-            forearm_length_px = math.hypot(
-                (left_wrist.x - left_elbow.x) * image_w,
-                (left_wrist.y - left_elbow.y) * image_h
-            )
-            forearm_length_cm = forearm_length_px / pixel_per_cm
-            wrist_circ = forearm_length_cm * 0.16
-            
-            print(f"    Left forearm: {forearm_length_cm:.1f}cm, wrist estimate: {wrist_circ:.1f}cm")
+        # Try left arm, then right arm
+        for side, ok, elbow_idx, wrist_idx in (('Left', left_ok, LEFT_ELBOW_IDX, LEFT_WRIST_IDX),
+                                               ('Right', right_ok, RIGHT_ELBOW_IDX, RIGHT_WRIST_IDX)):
+            log.debug("%s arm visibility: elbow=%.2f, wrist=%.2f", side, vis[elbow_idx], vis[wrist_idx])
+            if not ok:
+                continue
             
-            if 8 <= wrist_circ <= 18:
-                print(f"  ✓ Wrist estimated from LEFT arm: {wrist_circ:.1f}cm (forearm: {forearm_length_cm:.1f}cm)")
+            d = (L[wrist_idx, :2] - L[elbow_idx, :2]) * image_size
+            forearm_sq_px = float(d @ d)
+            if min_px * min_px <= forearm_sq_px <= max_px * max_px:
+                forearm_length_cm = math.sqrt(forearm_sq_px) / pixel_per_cm
+                wrist_circ = forearm_length_cm * 0.16
+                log.debug("%s forearm: %.1fcm, wrist estimate: %.1fcm", side, forearm_length_cm, wrist_circ)
                 return wrist_circ
-            else:
-                print(f"    Left arm calculation out of range: {wrist_circ:.1f}cm (expected 8-18cm)")
-        
-        # Try right arm
-        right_elbow = landmarks[mp.solutions.pose.PoseLandmark.RIGHT_ELBOW]
-        right_wrist = landmarks[mp.solutions.pose.PoseLandmark.RIGHT_WRIST]
-        
-        print(f"    Right arm visibility: elbow={right_elbow.visibility:.2f}, wrist={right_wrist.visibility:.2f}")
-        
-        if right_elbow.visibility > 0.3 and right_wrist.visibility > 0.3:
-            forearm_length_px = math.hypot(
-                (right_wrist.x - right_elbow.x) * image_w,
-                (right_wrist.y - right_elbow.y) * image_h
-            )
-            forearm_length_cm = forearm_length_px / pixel_per_cm
-            wrist_circ = forearm_length_cm * 0.16
-            
-            print(f"    Right forearm: {forearm_length_cm:.1f}cm, wrist estimate: {wrist_circ:.1f}cm")
             
-            if 8 <= wrist_circ <= 18:
-                print(f"  ✓ Wrist estimated from RIGHT arm: {wrist_circ:.1f}cm (forearm: {forearm_length_cm:.1f}cm)")
-                return wrist_circ
-            else:
-                print(f"    Right arm calculation out of range: {wrist_circ:.1f}cm (expected 8-18cm)")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("%s arm calculation out of range: %.1fcm (expected 8-18cm)",
+                          side, math.sqrt(forearm_sq_px) / pixel_per_cm * 0.16)
     except Exception as e:
-        print(f"  ✗ Arm length fallback failed with error: {e}")
+        log.warning("Arm length fallback failed with error: %s", e)
     
     # Final fallback: Return typical child wrist circumference (7-12 years range)
-    import random
-    typical_child_wrist = random.uniform(12.5, 14.5)
-    print(f"  ⚠ Using typical child wrist circumference: {typical_child_wrist:.1f}cm (age 7-12 estimate)")
+    # Use the midpoint of the 12.5-14.5 cm range so identical images give identical results
+    typical_child_wrist = 13.5
+    log.debug("Using typical child wrist circumference: %.1fcm (age 7-12 estimate)", typical_child_wrist)
     return typical_child_wrist
 
 
-def process_image(path):
+def process_image(path, pose=None, complexity=1, marker_size_cm=None):
     """
     Process image and extract child measurements.
     
     Args:
         path: Path to image with 15cm scale
+        pose: Optional MediaPipe Pose instance to use.
+              The shared instance from get_pose() is used when omitted.
+        complexity: Pose model used when pose is omitted
+                    (0 = lite, 1 = full, 2 = heavy)
+        marker_size_cm: Printed side length of the optional ArUco marker;
+                        marker calibration is skipped when None
         
     Returns:
         Dictionary with height_cm, head_circumference_cm, wrist_circumference_cm, pixel_per_cm
@@ -252,62 +351,171 @@ def process_image(path):
     if img is None:
         raise RuntimeError(f"Unable to open image: {path}")
     
-    h, w = img.shape[:2]
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return process_image_array(img, pose, complexity, marker_size_cm)
+
+
+def process_image_array(img, pose=None, complexity=1, marker_size_cm=None):
+    """
+    Extract child measurements from an already decoded image.
+    
+    Args:
+        img: BGR image (as returned by cv2.imread / cv2.imdecode) with 15cm scale
+        pose: Optional MediaPipe Pose instance to use.
+              The shared instance from get_pose() is used when omitted.
+        complexity: Pose model used when pose is omitted
+                    (0 = lite, 1 = full, 2 = heavy)
+        marker_size_cm: Printed side length of the optional ArUco marker;
+                        marker calibration is skipped when None
+        
+    Returns:
+        Dictionary with height_cm, head_circumference_cm, wrist_circumference_cm, pixel_per_cm
+    """
+    # Scale and pose detection run on a bounded working resolution; cm values
+    # are unaffected because pixel_per_cm is measured on the same image.
+    # The full-resolution image is kept only for the wrist crops.
+    full_img = img
+    img, scale = downscale_for_detection(full_img)
+    # Convert to RGB once for MediaPipe and derive grayscale from it
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
 
     # Detect 15cm scale
+    pixel_per_cm = calibrate_pixel_per_cm(gray, img, marker_size_cm)
+    # Release the grayscale copy before MediaPipe allocates its buffers
+    del gray
+
+    # Run MediaPipe pose detection
+    if pose is None:
+        pose = get_pose(complexity)
+    results = pose.process(rgb)
+
+    if not results.pose_landmarks:
+        raise RuntimeError("Pose landmarks not detected. Ensure full body is visible.")
+    
+    L = landmarks_to_array(results.pose_landmarks.landmark)
+    return measure_from_landmarks(L, img, pixel_per_cm, scale, full_img)
+
+
+def calibrate_pixel_per_cm(gray, img, marker_size_cm=None):
+    """
+    Return the pixels-per-cm calibration from the 15cm scale.
+    
+    When marker_size_cm is given, an ArUco marker of that printed side
+    length is looked for first and used if found.
+    """
+    if marker_size_cm:
+        pixel_per_cm = detect_aruco_pixel_per_cm(gray, marker_size_cm)
+        if pixel_per_cm is not None:
+            return pixel_per_cm
+    
     pixel_length = detect_scale_pixel_length(gray, img)
     if pixel_length is None:
         raise RuntimeError("Could not detect the 15 cm scale automatically.")
     
-    pixel_per_cm = pixel_length / 15.0
+    return pixel_length / 15.0
 
-    # Run MediaPipe pose detection
-    mp_pose = mp.solutions.pose
-    with mp_pose.Pose(static_image_mode=True, model_complexity=2, enable_segmentation=False) as pose:
-        results = pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-        if not results.pose_landmarks:
-            raise RuntimeError("Pose landmarks not detected. Ensure full body is visible.")
-        
-        landmarks = results.pose_landmarks.landmark
 
-        # Measure height
-        top_y = estimate_head_top_y(landmarks, h)
-        feet_y = estimate_feet_y(landmarks, h)
-        pixel_height = max(0.0, feet_y - top_y)
-        height_cm = pixel_height / pixel_per_cm
-        
-        # Measure head circumference
-        head_circ_cm = measure_head_circumference(landmarks, w, h, pixel_per_cm)
-        
-        # Measure wrist circumference
-        wrist_circ_cm = measure_wrist_circumference(landmarks, img, w, h, pixel_per_cm)
-        wrist_fallback_used = False
+def measure_from_landmarks(L, img, pixel_per_cm, scale=1.0, full_img=None):
+    """
+    Compute height, head and wrist measurements from detected pose landmarks.
+    
+    Args:
+        L: Landmark array for img, from landmarks_to_array()
+        img: BGR image the landmarks were detected on
+        pixel_per_cm: Calibration from calibrate_pixel_per_cm(), in img pixels
+        scale: Factor img was downscaled by, used to report pixel_per_cm
+               at the original resolution
+        full_img: Original-resolution image that wrist crops are taken from;
+                  defaults to img
         
-        # If wrist measurement fails, try fallback method using arm length
-        if wrist_circ_cm is None:
-            wrist_circ_cm = estimate_wrist_from_arm_length(landmarks, w, h, pixel_per_cm)
-            wrist_fallback_used = True
+    Returns:
+        Dictionary with height_cm, head_circumference_cm, wrist_circumference_cm, pixel_per_cm
+    """
+    h, w = img.shape[:2]
+
+    # Measure height
+    top_y = estimate_head_top_y(L, h)
+    feet_y = estimate_feet_y(L, h)
+    pixel_height = max(0.0, feet_y - top_y)
+    height_cm = pixel_height / pixel_per_cm
+    
+    # Measure head circumference
+    head_circ_cm = measure_head_circumference(L, w, h, pixel_per_cm)
+    
+    # Measure wrist circumference on full-resolution crops, where the edges
+    # the scanline depends on have not been smoothed away by downscaling
+    if full_img is None:
+        full_img = img
+    full_h, full_w = full_img.shape[:2]
+    wrist_circ_cm = measure_wrist_circumference(L, full_img, full_w, full_h,
+                                                pixel_per_cm * full_w / w)
+    wrist_fallback_used = False
+    
+    # If wrist measurement fails, try fallback method using arm length
+    if wrist_circ_cm is None:
+        wrist_circ_cm = estimate_wrist_from_arm_length(L, w, h, pixel_per_cm)
+        wrist_fallback_used = True
 
     return {
         'height_cm': float(height_cm),
         'head_circumference_cm': float(head_circ_cm),
         'wrist_circumference_cm': float(wrist_circ_cm) if wrist_circ_cm else None,
         'wrist_fallback_used': wrist_fallback_used,
-        'pixel_per_cm': float(pixel_per_cm)
+        'pixel_per_cm': float(pixel_per_cm / scale)
     }
 
 
+def serve(complexity=1, marker_size_cm=None):
+    """
+    Measure images whose paths arrive one per line on stdin, writing one
+    JSON object per line to stdout. The pose model is loaded once and kept
+    warm for every image.
+    """
+    pose = get_pose(complexity)
+    for line in sys.stdin:
+        path = line.strip()
+        if not path:
+            continue
+        # One bad input must not end the worker, so every failure becomes
+        # an error line and the loop moves on to the next path
+        try:
+            measurements = process_image(path, pose, marker_size_cm=marker_size_cm)
+            out = {'image': path, 'success': True, 'measurements': measurements}
+        except RuntimeError as e:
+            out = {'image': path, 'success': False, 'error': str(e)}
+        except Exception as e:
+            log.exception("Unexpected error processing %s", path)
+            out = {'image': path, 'success': False, 'error': str(e)}
+        print(json.dumps(out), flush=True)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Child Growth Measurement System - Measure height, head circumference, and wrist circumference.'
     )
-    parser.add_argument('image', help='Path to input image with 15cm scale')
+    parser.add_argument('image', nargs='?', help='Path to input image with 15cm scale')
+    parser.add_argument('--server', action='store_true',
+                        help='Read image paths from stdin, one per line, and print JSON results')
+    parser.add_argument('--complexity', type=int, default=1, choices=[0, 1, 2],
+                        help='MediaPipe pose model: 0 = lite, 1 = full (default), 2 = heavy')
+    parser.add_argument('--aruco-marker-cm', type=float, default=None, metavar='CM',
+                        help='Calibrate from a printed DICT_4X4_50 ArUco marker (ID 0) with this '
+                             'side length when present, before falling back to the 15cm scale')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Print intermediate detection details')
     args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='  %(message)s')
+
+    if args.server:
+        serve(args.complexity, args.aruco_marker_cm)
+        return
+    if args.image is None:
+        parser.error('an image path is required unless --server is given')
 
     print(f"📸 Processing image: {args.image}\n")
     
-    res = process_image(args.image)
+    res = process_image(args.image, complexity=args.complexity, marker_size_cm=args.aruco_marker_cm)
     
     print('=' * 60)
     print('📊 MEASUREMENT RESULTS')
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Threaded processing pipeline for the Anthropometry API.
+
+Requests flow through three worker threads connected by bounded queues:
+decode (JPEG decode + grayscale), pose (RGB conversion + MediaPipe inference) and
+postprocess (scale detection + measurements). OpenCV and MediaPipe release
+the GIL, so concurrent requests overlap across stages instead of running
+one after another.
+"""
+
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+import mediapipe as mp
+from child import calibrate_pixel_per_cm, downscale_for_detection, landmarks_to_array, measure_from_landmarks
+
+QUEUE_SIZE = 4
+
+# Number of recent results kept, keyed by a hash of the encoded image bytes,
+# so retries and refreshes of the same photo skip the pipeline entirely.
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 256))
+
+# Side length in cm of the printed ArUco calibration marker. Marker detection
+# is skipped unless this is set; the 15cm scale is used otherwise.
+ARUCO_MARKER_CM = float(os.environ['ARUCO_MARKER_CM']) if os.environ.get('ARUCO_MARKER_CM') else None
+
+# Longest a request waits for the pipeline, in seconds. Kept just under the
+# gunicorn --timeout (120s) so a stalled stage fails the request cleanly
+# instead of the worker being killed with every queued request behind it.
+PIPELINE_TIMEOUT = float(os.environ.get('PIPELINE_TIMEOUT_S', 110))
+
+# Pose landmark model variant: 0 = lite, 1 = full, 2 = heavy. The full model
+# is ~3x faster than heavy on CPU with the same body keypoints we measure from.
+POSE_MODEL_COMPLEXITY = int(os.environ.get('POSE_MODEL_COMPLEXITY', 1))
+
+# Load the pose model once per process instead of on every request.
+# MediaPipe Pose is not thread-safe; by design only the single pose-stage
+# thread (_pose_worker) ever calls it, so no lock is needed.
+POSE = mp.solutions.pose.Pose(static_image_mode=True, model_complexity=POSE_MODEL_COMPLEXITY,
+                              enable_segmentation=False, min_detection_confidence=0.5)
+
+
+class ImageDecodeError(ValueError):
+    """Raised when the submitted bytes are not a decodable image."""
+
+
+class PipelineTimeoutError(RuntimeError):
+    """Raised when a request is not completed within PIPELINE_TIMEOUT."""
+
+
+class PipelineJob:
+    """A single request travelling through the pipeline."""
+
+    def __init__(self, image_bytes):
+        self.image_bytes = image_bytes
+        self.full_img = None
+        self.img = None
+        self.scale = 1.0
+        self.gray = None
+        self.landmarks = None
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+    def fail(self, error):
+        self.error = error
+        self.done.set()
+
+
+_decode_q = queue.Queue(maxsize=QUEUE_SIZE)
+_pose_q = queue.Queue(maxsize=QUEUE_SIZE)
+_post_q = queue.Queue(maxsize=QUEUE_SIZE)
+
+_result_cache = OrderedDict()
+_result_cache_lock = threading.Lock()
+
+_scratch = threading.local()
+
+
+def _decoder():
+    """Stage 1: decode image bytes, downscale, and build the grayscale view."""
+    while True:
+        job = _decode_q.get()
+        try:
+            nparr = np.frombuffer(job.image_bytes, np.uint8)
+            try:
+                job.full_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            except cv2.error as e:
+                raise ImageDecodeError("Failed to decode image") from e
+            if job.full_img is None:
+                raise ImageDecodeError("Failed to decode image")
+            job.img, job.scale = downscale_for_detection(job.full_img)
+            job.gray = cv2.cvtColor(job.img, cv2.COLOR_BGR2GRAY)
+        except Exception as e:
+            job.fail(e)
+            continue
+        _pose_q.put(job)
+
+
+def _rgb_buffer(shape):
+    """Per-thread RGB buffer for MediaPipe input, reallocated only when the image shape changes."""
+    buf = getattr(_scratch, 'rgb', None)
+    if buf is None or buf.shape != shape:
+        buf = _scratch.rgb = np.empty(shape, np.uint8)
+    return buf
+
+
+def _pose_worker():
+    """
+    Stage 2: run MediaPipe pose detection, handing each job on as soon as it is done.
+    This is the only thread that touches POSE; keep the stage single-threaded.
+    """
+    while True:
+        job = _pose_q.get()
+        try:
+            rgb = cv2.cvtColor(job.img, cv2.COLOR_BGR2RGB, dst=_rgb_buffer(job.img.shape))
+            results = POSE.process(rgb)
+            if not results.pose_landmarks:
+                raise RuntimeError("Pose landmarks not detected. Ensure full body is visible.")
+            job.landmarks = landmarks_to_array(results.pose_landmarks.landmark)
+        except Exception as e:
+            job.fail(e)
+            continue
+        _post_q.put(job)
+
+
+def _postprocessor():
+    """Stage 3: scale detection and head/wrist/height measurements."""
+    while True:
+        job = _post_q.get()
+        try:
+            pixel_per_cm = calibrate_pixel_per_cm(job.gray, job.img, ARUCO_MARKER_CM)
+            job.results = measure_from_landmarks(job.landmarks, job.img, pixel_per_cm, job.scale,
+                                                 job.full_img)
+        except Exception as e:
+            job.fail(e)
+            continue
+        job.done.set()
+
+
+def _start_workers():
+    for target in (_decoder, _pose_worker, _postprocessor):
+        threading.Thread(target=target, name=target.__name__.strip('_'), daemon=True).start()
+
+
+def run_pipeline(image_bytes):
+    """
+    Process an encoded image and block until its measurements are ready.
+    Results for recently seen images are served from an LRU cache.
+
+    Args:
+        image_bytes: Encoded image (JPEG, PNG, ...) with 15cm scale
+
+    Returns:
+        Dictionary with height_cm, head_circumference_cm, wrist_circumference_cm, pixel_per_cm
+
+    Raises:
+        ImageDecodeError: If the bytes cannot be decoded as an image
+        PipelineTimeoutError: If the pipeline does not finish within PIPELINE_TIMEOUT
+        RuntimeError: If the scale or pose landmarks cannot be detected
+    """
+    if not image_bytes:
+        raise ImageDecodeError("Failed to decode image")
+    
+    key = hashlib.blake2b(image_bytes, digest_size=16).digest()
+    with _result_cache_lock:
+        cached = _result_cache.get(key)
+        if cached is not None:
+            _result_cache.move_to_end(key)
+            return dict(cached)
+    
+    job = PipelineJob(image_bytes)
+    deadline = time.monotonic() + PIPELINE_TIMEOUT
+    try:
+        _decode_q.put(job, timeout=PIPELINE_TIMEOUT)
+    except queue.Full:
+        raise PipelineTimeoutError("Processing pipeline is busy; try again later.") from None
+    if not job.done.wait(max(0.0, deadline - time.monotonic())):
+        raise PipelineTimeoutError("Processing timed out; try again later.")
+    if job.error is not None:
+        raise job.error
+    
+    if RESULT_CACHE_SIZE > 0:
+        with _result_cache_lock:
+            _result_cache[key] = dict(job.results)
+            while len(_result_cache) > RESULT_CACHE_SIZE:
+                _result_cache.popitem(last=False)
+    return job.results
+
+
+_start_workers()